@@ -1,50 +1,458 @@
+import collections
+import contextlib
+import hashlib
 import importlib
+import itertools
 import json
 import os
+import re
+import signal
+import sys
+import threading
+import time
 import traceback
 
 root_dir = os.getcwd()
 
-def run(graph_type, graph, checks):
-	preprocess = importlib.import_module('preprocess')
+# type.json contents and check registries (see check_registry()) per graph
+# type; these are loaded once per process, so that a long-running worker (see
+# serve()) does not re-read them for every submission
+type_infos = {}
+check_registries = {}
 
-	# search either in ./type.json (on the server)
-	# or in ./<graph_type>/type.json (on the tester)
-	type_file = os.path.join(root_dir, 'type.json')
+# A dict with a maximum size, which evicts the least recently used entry when
+# it becomes full.
+class LRUCache:
+	def __init__(self, max_size):
+		self.max_size = max_size
+		self.entries = collections.OrderedDict()
+
+	# Returns the value for key, calling compute() to produce (and store) it
+	# if it is not in the cache yet.
+	def get(self, key, compute):
+		if key in self.entries:
+			self.entries.move_to_end(key)
+			return self.entries[key]
+		value = compute()
+		self.entries[key] = value
+		if len(self.entries) > self.max_size:
+			self.entries.popitem(last=False)
+		return value
+
+# preprocessed 'graph' arguments (such as reference answers), keyed by a hash
+# of the graph type and the graph JSON; in a worker or batch run, this makes
+# sure each reference graph is preprocessed only once
+preprocessed_graphs = LRUCache(64)
+
+# compiled code of custom checks, keyed by a hash of the code, so that in a
+# worker or batch run each custom check is compiled only once
+compiled_custom_checks = LRUCache(64)
+
+def compile_custom_check(code):
+	key = hashlib.sha256(code.encode('utf-8')).hexdigest()
+	return compiled_custom_checks.get(key, lambda: compile(code, '<string>', 'exec'))
+
+# languages generated by generate_language(), keyed by a hash of the canonical
+# text of the automaton, grammar or regular expression and the length; this
+# makes sure that checks of the same answer with the same length share the
+# enumeration, and in a worker or batch run, that the language of a reference
+# answer is enumerated only once
+generated_languages = LRUCache(64)
+
+# Returns the set of words of at most the given length in the language of L
+# (a gambatools automaton, grammar or regular expression), like gambatools'
+# generate_language(). If generate is given, generate(L, length) is used to
+# compute the language instead (which should give the same result). The result
+# is cached, so it must not be modified.
+def generate_language(L, length, generate=None):
+	if generate is None:
+		from gambatools.notebook import generate_language as generate
+	text = canonical_text(L) + ' ' + str(length)
+	key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+	return generated_languages.get(key, lambda: generate(L, length))
+
+# number of worker processes that map_words() may use; with 0 (the default, and
+# always in the sandbox) everything runs in this process
+word_workers = 0
+
+# the pool of word_workers processes, which is started when it is first needed
+word_pool = None
+
+# map_words() only uses the pool if each process gets at least this many words,
+# since otherwise sending the work around costs more than it saves
+min_words_per_worker = 16
+
+# Returns the results of function(automaton, word, *args) for each of the words,
+# in order. If word_workers is set and there are enough words, the words are
+# divided over n worker processes (process i getting words i, i + n, i + 2n,
+# ..., which spreads long words evenly), so that each process gets the
+# automaton only once together with its share of the words. Otherwise, the
+# results are computed in this process, one by one as they are consumed, so a
+# check that stops at the first wrong word does not pay for the others. The
+# function, the automaton and the arguments must be picklable (so the function
+# must be defined at the top level of a module).
+def map_words(function, automaton, words, *args):
+	global word_pool
+	words = list(words)
+	shards = min(word_workers, len(words) // min_words_per_worker)
+	if shards < 2:
+		return (function(automaton, word, *args) for word in words)
+
+	if word_pool is None:
+		# imported here, since the sandbox never gets this far
+		import multiprocessing
+		word_pool = multiprocessing.Pool(word_workers)
+	tasks = [(function, automaton, words[i::shards], args) for i in range(shards)]
 	try:
-		with open(type_file) as f:
-			type_info = json.load(f)
-	except FileNotFoundError:
-		type_file = os.path.join(root_dir, graph_type, 'type.json')
-		with open(type_file) as f:
-			type_info = json.load(f)
+		shard_results = word_pool.map(_map_shard, tasks, chunksize=1)
+	except BaseException:
+		# the check may have been stopped (for example by its time limit)
+		# while the workers are still busy, so start over with a new pool
+		word_pool.terminate()
+		word_pool = None
+		raise
+	results = [None] * len(words)
+	for i, shard_result in enumerate(shard_results):
+		results[i::shards] = shard_result
+	return results
 
-	if 'python_modules' in type_info:
-		for module in type_info['python_modules']:
-			globals()[module] = importlib.import_module(module)
+def _map_shard(task):
+	function, automaton, words, args = task
+	return [function(automaton, word, *args) for word in words]
+
+# Returns a text that represents the contents of value, which is the same for
+# equal values regardless of the iteration order of sets and dicts. Objects
+# are represented by their class name and attributes, except attributes
+# starting with an underscore (which gambatools does not use, but checks may
+# use for caches). Empty collections in dicts are left out, since gambatools
+# uses defaultdicts in which looking up a missing key adds an empty set.
+def canonical_text(value):
+	if isinstance(value, str):
+		# gambatools uses subclasses of str for symbols
+		return type(value).__name__ + str.__repr__(value)
+	if isinstance(value, (list, tuple)):
+		return '[' + ','.join(canonical_text(v) for v in value) + ']'
+	if isinstance(value, (set, frozenset)):
+		return '{' + ','.join(sorted(canonical_text(v) for v in value)) + '}'
+	if isinstance(value, dict):
+		return '{' + ','.join(sorted(canonical_text(k) + ':' + canonical_text(v)
+			for k, v in value.items()
+			if not (isinstance(v, (list, tuple, set, frozenset, dict)) and len(v) == 0))) + '}'
+	if hasattr(value, '__dict__'):
+		return type(value).__name__ + canonical_text({k: v for k, v in vars(value).items()
+			if not k.startswith('_')})
+	return repr(value)
+
+# Records the wall-clock and CPU time spent in the phases of a run, as events
+# in the Chrome trace event format (see write_trace()).
+class Profiler:
+	def __init__(self):
+		self.start = time.perf_counter()
+		self.events = []
+
+	# Context manager that measures the code in its body. The event gets the
+	# given name and category; if timings is given, the elapsed time is also
+	# stored in it as timings[category] = {'wall': ..., 'cpu': ...} (in
+	# seconds).
+	@contextlib.contextmanager
+	def measure(self, name, category, timings=None):
+		wall_start = time.perf_counter()
+		cpu_start = time.process_time()
+		try:
+			yield
+		finally:
+			wall = time.perf_counter() - wall_start
+			cpu = time.process_time() - cpu_start
+			if timings is not None:
+				timings[category] = {'wall': wall, 'cpu': cpu}
+			self.events.append({
+				'name': name,
+				'cat': category,
+				'ph': 'X',
+				'ts': (wall_start - self.start) * 1e6,
+				'dur': wall * 1e6,
+				'pid': os.getpid(),
+				'tid': 0,
+				'args': {'cpu_us': cpu * 1e6}
+			})
+
+	# Writes the events to a JSON file that can be opened in chrome://tracing
+	# or https://ui.perfetto.dev.
+	def write_trace(self, trace_file):
+		with open(trace_file, 'w') as f:
+			json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+
+# the Profiler of the current run, or None if the run is not being timed
+profiler = None
 
-	if not graph:
-		return {
-			'type': 'preprocess_fail',
-			'feedback': 'You submitted an empty answer'
-		}
+# time (in seconds) it took to import each module imported through
+# import_module()
+import_times = {}
 
+# Imports the module with the given name (if it was not imported already),
+# recording the time it took in import_times.
+def import_module(name):
+	if name in sys.modules:
+		return sys.modules[name]
+	start = time.perf_counter()
+	with measure(name, 'import'):
+		module = importlib.import_module(name)
+	import_times[name] = time.perf_counter() - start
+	return module
+
+# Stands in for a module that is only imported when one of its attributes is
+# first accessed (see load_type_info()).
+class LazyModule:
+	def __init__(self, name):
+		self.__dict__['_name'] = name
+		self.__dict__['_module'] = None
+
+	def __getattr__(self, attribute):
+		if self._module is None:
+			self.__dict__['_module'] = import_module(self._name)
+		return getattr(self._module, attribute)
+
+# Raised in a check that runs longer than its time budget. It is raised
+# asynchronously, anywhere in the check, so it derives from BaseException (like
+# KeyboardInterrupt) to get past the 'except Exception' clauses in check code.
+class CheckTimeout(BaseException):
+	pass
+
+# Context manager that interrupts its body by raising CheckTimeout if it uses
+# more than the given number of seconds of CPU time (if seconds is not None).
+# CPU time is what the sandbox limits, so this is measured with ITIMER_PROF and
+# SIGPROF. Signals only work on the main thread of a Unix process (as is the
+# case in the sandbox and in the worker and batch modes); elsewhere, the body
+# just runs without a time limit.
+@contextlib.contextmanager
+def time_limit(seconds):
+	if seconds is None or not hasattr(signal, 'setitimer') or \
+			threading.current_thread() is not threading.main_thread():
+		yield
+		return
+
+	def handler(signum, frame):
+		raise CheckTimeout()
+
+	old_handler = signal.signal(signal.SIGPROF, handler)
+	signal.setitimer(signal.ITIMER_PROF, seconds)
+	try:
+		yield
+	finally:
+		signal.setitimer(signal.ITIMER_PROF, 0)
+		signal.signal(signal.SIGPROF, old_handler)
+
+def measure(name, category, timings=None):
+	if profiler is None:
+		return contextlib.nullcontext()
+	return profiler.measure(name, category, timings)
+
+# Grades the answer graph of the given graph type using the checks (a JSON
+# string).
+#
+# If lazy is True, checks whose outcome cannot influence the grade anymore
+# (because an earlier check in the same grade block already failed) are not
+# run. The grade is the same as without lazy, but the skipped checks appear in
+# the results only as {'module': ..., 'method': ..., 'skipped': True}, so this
+# is only useful when the feedback is not shown to the student (for example,
+# when regrading).
+#
+# If timing is True, each result gets a 'timing' key containing the wall-clock
+# and CPU time spent on preprocessing the answer, converting the arguments,
+# running the check and converting its feedback, and the output gets an
+# 'imports' key with the time it took to import each module in this process.
+# If trace_file is given, a trace of the whole run (including module imports)
+# is written to that file in the Chrome trace event format.
+def run(graph_type, graph, checks, lazy=False, timing=False, trace_file=None):
+	return list(run_batch(graph_type, [graph], checks, lazy, timing, trace_file))[0]
+
+# Grades a sequence of answers of the given graph type against the same checks.
+# Yields one result (as returned by run()) per answer. Loading the checks and
+# converting their arguments (including preprocessing graph arguments) is done
+# only once for the whole batch.
+#
+# The answers are read in chunks of batch_size, and checks that have a batch
+# version (see run_batch_checks()) grade each chunk at once.
+def run_batch(graph_type, graphs, checks, lazy=False, timing=False, trace_file=None):
+	global profiler
+	if timing or trace_file:
+		profiler = Profiler()
 	try:
-		graph = preprocess.preprocess(graph)
-	except Exception as e:
-		return {
-			'type': 'preprocess_fail',
-			'feedback': str(e)
-		}
+		preprocess = import_module('preprocess')
+		load_type_info(graph_type)
+
+		prepared = None
+		graphs = iter(graphs)
+		while True:
+			chunk = list(itertools.islice(graphs, batch_size))
+			if not chunk:
+				break
+
+			# the preprocessed answers with their timings, or the
+			# preprocess_fail results
+			answers = []
+			for graph in chunk:
+				if not graph:
+					answers.append({
+						'type': 'preprocess_fail',
+						'feedback': 'You submitted an empty answer'
+					})
+					continue
+
+				timings = {} if timing else None
+				try:
+					with measure('preprocess', 'preprocess', timings):
+						graph = preprocess.preprocess(graph)
+				except Exception as e:
+					answers.append({
+						'type': 'preprocess_fail',
+						'feedback': str(e)
+					})
+					continue
+				answers.append((graph, timings))
+
+			graphs_ok = [answer[0] for answer in answers if isinstance(answer, tuple)]
+			if not graphs_ok:
+				yield from answers
+				continue
+			if prepared is None:
+				prepared = prepare_checks(graph_type, checks, preprocess)
+			batch_results = run_batch_checks(prepared, graphs_ok, timing)
+
+			i = 0
+			for answer in answers:
+				if not isinstance(answer, tuple):
+					yield answer
+					continue
+				graph, timings = answer
+				result = run_prepared(prepared, graph, lazy, timings, batch_results[i])
+				i += 1
+				if timing:
+					result['imports'] = dict(import_times)
+				yield result
+	finally:
+		if trace_file:
+			profiler.write_trace(trace_file)
+		profiler = None
+
+# Parses the checks JSON string and looks up the check method and converted
+# arguments for each check. Returns a list containing, for each entry in the
+# checks JSON, a dict with the original 'check' and either the 'method',
+# 'metadata', 'arguments' and 'timeout' to run it with (for custom checks, the
+# compiled 'code', the 'timeout' and the function that converts the answer to
+# the 'student_answer' the code gets), or the 'error' that occurred while
+# setting it up.
+#
+# If preprocess.py defines a function custom_check_answer(), custom checks get
+# the preprocessed answer converted by that function; otherwise they get the
+# preprocessed answer as is.
+#
+# The timeout (in seconds, or None for no limit) is taken from the 'timeout' key
+# of the check in the checks JSON if present, otherwise from the 'timeout' key
+# of the check metadata, otherwise from the 'check_timeout' key in type.json.
+def prepare_checks(graph_type, checks, preprocess):
+	registry = check_registry(graph_type)
+	default_timeout = load_type_info(graph_type).get('check_timeout')
+
+	prepared = []
+	for check in json.loads(checks):
+		if 'type' in check and check['type'] == 'grade':
+			prepared.append({'check': check})
+			continue
+		if check['module'] == 'custom' and check['method'] == 'custom':
+			try:
+				prepared.append({
+					'check': check,
+					'code': compile_custom_check(check['arguments']['code']),
+					'timeout': check.get('timeout', default_timeout),
+					'answer': getattr(preprocess, 'custom_check_answer', None)
+				})
+			except:
+				prepared.append({
+					'check': check,
+					'error': traceback.format_exc()
+				})
+			continue
+		try:
+			name = check['module'] + '.' + check['method']
+			check_module = import_module(check['module'])
+			check_method = getattr(check_module, check['method'])
+			data = registry[(check['module'], check['method'])]
+			timings = {}
+			with measure(name, 'arguments', timings):
+				argument = convert_arguments(check['arguments'], data['params'], preprocess, graph_type)
+			timeout = data['metadata'].get('timeout', default_timeout)
+			batch_method = None
+			if 'batch' in data['metadata']:
+				batch_method = getattr(check_module, data['metadata']['batch'])
+			prepared.append({
+				'check': check,
+				'method': check_method,
+				'batch_method': batch_method,
+				'metadata': data['metadata'],
+				'arguments': argument,
+				'timeout': check.get('timeout', timeout),
+				'timing': timings
+			})
+		except:
+			prepared.append({
+				'check': check,
+				'error': traceback.format_exc()
+			})
+	return prepared
 
-	check_data = available_checks(graph_type)
+# Number of answers that run_batch() reads at once.
+batch_size = 256
 
-	checks = json.loads(checks)
+# Runs the checks prepared by prepare_checks() that have a batch version on a
+# list of preprocessed answers at once. A check module can provide a batch
+# version of a check by naming a function in the 'batch' key of the check
+# metadata; that function gets the list of answers and the check arguments and
+# returns the list of results. Returns a list containing for each answer a dict
+# that maps the index of each of these checks in prepared to its result.
+#
+# Batch versions are only used for more than one answer. If one fails or takes
+# longer than the check's timeout for every answer together, its results are
+# left out, so that the check runs on each answer separately (and reports the
+# problem like it normally would). If timing is True, the time of the batch is
+# divided evenly over the answers.
+def run_batch_checks(prepared, graphs, timing=False):
+	batch_results = [{} for graph in graphs]
+	if len(graphs) < 2:
+		return batch_results
+	for index, entry in enumerate(prepared):
+		if entry.get('batch_method') is None:
+			continue
+		check = entry['check']
+		name = check['module'] + '.' + check['method']
+		timeout = entry['timeout']
+		if timeout is not None:
+			timeout *= len(graphs)
+		timings = {}
+		try:
+			with measure(name + ' (batch)', 'check', timings), time_limit(timeout):
+				results = entry['batch_method'](graphs, **entry['arguments'])
+		except:
+			continue
+		for i, result in enumerate(results):
+			if timing:
+				result['timing'] = {'check': {key: value / len(graphs)
+					for key, value in timings['check'].items()}}
+			batch_results[i][index] = result
+	return batch_results
+
+# Runs checks prepared by prepare_checks() on a preprocessed answer (see run()
+# for the meaning of lazy). If timings is not None, it should contain the time
+# spent on preprocessing the answer, and timings are added to each result.
+# batch_results can contain results of checks that were already run on this
+# answer by run_batch_checks().
+def run_prepared(prepared, graph, lazy=False, timings=None, batch_results=None):
 	results = []
 	correct = True
 	grade = 0  # points awarded
 	totalGrade = 0  # total points seen in partial grade blocks
-	for check in checks:
+	for index, entry in enumerate(prepared):
+		check = entry['check']
 		if 'type' in check and check['type'] == 'grade':
 			points = float(check['points']) / 100
 			totalGrade += points
@@ -52,39 +460,79 @@ def run(graph_type, graph, checks):
 				grade += points
 			elif check['continue']:
 				correct = True
+		elif lazy and not correct:
+			# a check failed since the last grade block that continues, so
+			# no points can be awarded until then, regardless of this check
+			results.append({
+				'module': check['module'],
+				'method': check['method'],
+				'skipped': True
+				})
+		elif 'error' in entry:
+			result = {
+				'module': check['module'],
+				'method': check['method'],
+				'error': entry['error']
+				}
+			if timings is not None:
+				result['timing'] = dict(timings)
+			results.append(result)
 		else:
+			check_timings = {}
+			if timings is not None:
+				check_timings.update(timings)
+				check_timings.update(entry.get('timing', {}))
+			name = check['module'] + '.' + check['method']
 			try:
 				if check['module'] == 'custom' and check['method'] == 'custom':
-					check_code = check['arguments']['code']
+					check_code = entry['code']
 					result = {}
+					student_answer = graph
+					if entry['answer'] is not None:
+						student_answer = entry['answer'](graph)
 					vars = {
-						'student_answer': graph,
+						'student_answer': student_answer,
 						'result': result,
 					}
-					exec(check_code, vars)
+					with measure(name, 'check', check_timings), time_limit(entry['timeout']):
+						exec(check_code, vars)
 					result = vars['result']
 					if not 'correct' in result:
 						raise Exception('\'correct\' key not found in custom check output')
 				else:
-					check_module = importlib.import_module(check['module'])
-					check_method = getattr(check_module, check['method'])
-					data = check_data[check['module']]['checks'][check['method']]
-					argument = convert_arguments(check['arguments'], data, preprocess)
-					result = check_method(graph, **argument)
+					if batch_results is not None and index in batch_results:
+						result = batch_results[index]
+						check_timings.update(result.pop('timing', {}))
+					else:
+						with measure(name, 'check', check_timings), time_limit(entry['timeout']):
+							result = entry['method'](graph, **entry['arguments'])
 					if 'feedback' in result:
-						result['feedback'] = convert_feedback(check, data, result)
+						with measure(name, 'feedback', check_timings):
+							result['feedback'] = convert_feedback(check, entry['metadata'], result)
 				result['module'] = check['module']
 				result['method'] = check['method']
 				if not result['correct']:
 					correct = False
-				results.append(result)
+			except CheckTimeout:
+				correct = False
+				result = {
+					'module': check['module'],
+					'method': check['method'],
+					'correct': False,
+					'timeout': entry['timeout'],
+					'feedback': 'This check was stopped because it took longer than ' +
+						str(entry['timeout']) + ' seconds'
+					}
 			except:
 				stacktrace = traceback.format_exc()
-				results.append({
+				result = {
 					'module': check['module'],
 					'method': check['method'],
 					'error': stacktrace
-					})
+					}
+			if timings is not None:
+				result['timing'] = check_timings
+			results.append(result)
 
 	# if less than 100% of the points have been awarded, and the last checks
 	# were correct, award the remainder of the points
@@ -97,14 +545,56 @@ def run(graph_type, graph, checks):
 		'grade': grade
 	}
 
-def convert_arguments(args, check, preprocess):
+# Checks that the code of all custom checks in the checks JSON string compiles.
+# Returns a list of error messages, which is empty if there are no problems.
+# This is meant to be called when the question is saved, so that syntax errors
+# do not need to be found on a student attempt.
+def validate_checks(checks):
+	errors = []
+	for check in json.loads(checks):
+		if 'type' in check and check['type'] == 'grade':
+			continue
+		if check['module'] == 'custom' and check['method'] == 'custom':
+			try:
+				compile_custom_check(check['arguments']['code'])
+			except SyntaxError as e:
+				errors.append('Custom check has a syntax error on line ' +
+						str(e.lineno) + ': ' + str(e.msg))
+	return errors
+
+def load_type_info(graph_type):
+	if graph_type in type_infos:
+		return type_infos[graph_type]
+
+	# search either in ./type.json (on the server)
+	# or in ./<graph_type>/type.json (on the tester)
+	type_file = os.path.join(root_dir, 'type.json')
+	try:
+		with open(type_file) as f:
+			type_info = json.load(f)
+	except FileNotFoundError:
+		type_file = os.path.join(root_dir, graph_type, 'type.json')
+		with open(type_file) as f:
+			type_info = json.load(f)
+
+	# the python_modules are only imported when they are actually used, so
+	# that checks that don't need them don't pay for importing them
+	if 'python_modules' in type_info:
+		for module in type_info['python_modules']:
+			globals()[module] = LazyModule(module)
+
+	type_infos[graph_type] = type_info
+	return type_info
+
+# param_types - Maps each parameter name of the check to its type (see
+#               check_registry()).
+def convert_arguments(args, param_types, preprocess, graph_type):
 	converted = {}
 	for a in args:
-		converted[a] = convert_argument(a, args[a], check, preprocess)
+		converted[a] = convert_argument(a, args[a], param_types[a], preprocess, graph_type)
 	return converted
 
-def convert_argument(name, value, check, preprocess):
-	param_type = next(p for p in check['params'] if p['param'] == name)['type']
+def convert_argument(name, value, param_type, preprocess, graph_type):
 	if param_type == 'integer':
 		return int(value)
 	elif param_type == 'string_list':
@@ -115,7 +605,8 @@ def convert_argument(name, value, check, preprocess):
 			values = values[0].split(' ')
 		return values
 	elif param_type == 'graph':
-		return preprocess.preprocess(value)
+		key = hashlib.sha256((graph_type + '\n' + value).encode('utf-8')).hexdigest()
+		return preprocessed_graphs.get(key, lambda: preprocess.preprocess(value))
 	else:
 		return value
 
@@ -140,6 +631,31 @@ def available_checks(graph_type):
 
 	return modules
 
+# Returns the checks of the given graph type, indexed for fast lookup. The
+# result maps each (module, method) pair to a dict with keys
+# * 'metadata': the check's metadata from the module's JSON file;
+# * 'params': a dict mapping each parameter name to its type.
+#
+# The registry is built from the JSON files only once per process.
+def check_registry(graph_type):
+	if not graph_type in check_registries:
+		check_registries[graph_type] = build_registry(available_checks(graph_type))
+	return check_registries[graph_type]
+
+def build_registry(modules):
+	registry = {}
+	for module, module_data in modules.items():
+		# note: type.json ends up in modules too, but has no checks
+		for method, data in module_data.get('checks', {}).items():
+			params = {}
+			for p in data.get('params', []):
+				params[p['param']] = p['type']
+			registry[(module, method)] = {
+				'metadata': data,
+				'params': params
+			}
+	return registry
+
 # Produces the feedback string to be shown to the student.
 #
 # check - The check settings set by the question author (which contains customized
@@ -162,13 +678,215 @@ def convert_feedback(check, metadata, result):
 	if 'feedback' in check and result['feedback'] in check['feedback']:
 		string = check['feedback'][result['feedback']]
 
-	# ... and replace each placeholder by its value in the check result
+	# ... and replace each placeholder by its value in the check result, or
+	# else in the check arguments
+	template = feedback_templates.get(string, lambda: compile_feedback(string))
+	if template is not None:
+		filled = fill_feedback(template, result, check['arguments'])
+		if filled is not None:
+			return filled
+
+	# the template could not be filled in one pass, so replace the
+	# placeholders one by one
 	for field in result:
 		string = string.replace('[[' + field + ']]', str(result[field]))
-
-	# ... and also the check arguments
 	for argument in check['arguments']:
 		string = string.replace('[[' + argument + ']]', str(check['arguments'][argument]))
 
 	return string
 
+# feedback strings compiled by compile_feedback(), keyed by the string itself
+feedback_templates = LRUCache(1024)
+
+placeholder_regex = re.compile(r'\[\[([^\[\]]*)\]\]')
+
+# Splits a feedback string into a list [text, placeholder, text, placeholder,
+# ..., text] of the literal text and the placeholder names in between. Returns
+# None if the text contains brackets outside of placeholders.
+def compile_feedback(string):
+	template = placeholder_regex.split(string)
+	for text in template[0::2]:
+		if '[' in text or ']' in text:
+			return None
+	return template
+
+# Fills in a template produced by compile_feedback() in a single pass. Returns
+# None if that would not give the same string as replacing the placeholders one
+# by one (as convert_feedback() does otherwise); this can happen only if a value
+# contains brackets, which could form a new placeholder.
+def fill_feedback(template, result, arguments):
+	filled = []
+	for i, part in enumerate(template):
+		if i % 2 == 0:
+			filled.append(part)
+			continue
+		if part in result:
+			value = str(result[part])
+		elif part in arguments:
+			value = str(arguments[part])
+		else:
+			value = '[[' + part + ']]'
+		if '[' in value or ']' in value:
+			if part in result or part in arguments:
+				return None
+		filled.append(value)
+	return ''.join(filled)
+
+
+# Grades submissions for a single graph type in a loop, reading one JSON
+# request per line from infile and writing one JSON result per line to outfile.
+# Each request is an object with keys 'graph' and 'checks' (either the checks
+# JSON string that run() expects, or the decoded list), and optionally an 'id'
+# that is copied into the result. Because the process stays alive, the graph
+# type's modules, type.json and check metadata are only loaded once.
+def serve(graph_type, infile=sys.stdin, outfile=sys.stdout):
+	for line in infile:
+		if line.strip() == '':
+			continue
+		request = {}
+		try:
+			request = json.loads(line)
+			checks = request['checks']
+			if not isinstance(checks, str):
+				checks = json.dumps(checks)
+
+			# outfile may be stdout, so make sure that checks printing
+			# something cannot corrupt the output
+			with contextlib.redirect_stdout(sys.stderr):
+				result = run(graph_type, request['graph'], checks,
+						request.get('lazy', False), request.get('timing', False),
+						request.get('trace'))
+		except:
+			result = {
+				'type': 'error',
+				'error': traceback.format_exc()
+			}
+		if isinstance(request, dict) and 'id' in request:
+			result['id'] = request['id']
+		outfile.write(json.dumps(result) + '\n')
+		outfile.flush()
+
+# Like serve(), but listens on a Unix domain socket at the given path instead.
+# Each connection is a JSON-lines stream as described for serve(); connections
+# are handled one at a time.
+def serve_socket(graph_type, path):
+	import socketserver
+
+	class Handler(socketserver.StreamRequestHandler):
+		def handle(self):
+			infile = (line.decode('utf-8') for line in self.rfile)
+			outfile = _SocketWriter(self.wfile)
+			serve(graph_type, infile, outfile)
+
+	if os.path.exists(path):
+		os.remove(path)
+	with socketserver.UnixStreamServer(path, Handler) as server:
+		server.serve_forever()
+
+class _SocketWriter:
+	def __init__(self, wfile):
+		self.wfile = wfile
+
+	def write(self, s):
+		self.wfile.write(s.encode('utf-8'))
+
+	def flush(self):
+		self.wfile.flush()
+
+# Makes the checks of the given graph type importable, when running from the
+# checks directory (on the server, everything is in the working directory
+# already).
+def use_graph_type(graph_type):
+	directory = os.path.join(root_dir, graph_type)
+	if os.path.isdir(directory) and not directory in sys.path:
+		sys.path.insert(0, directory)
+
+# Reads one JSON object per line from infile, each containing the answer in
+# 'graph' (and optionally an 'id'), grades all of them against the same checks
+# with run_batch(), and writes the results to outfile as JSON lines. A line that
+# cannot be read gets an 'error' result, like in serve(), and the other lines
+# are still graded.
+def serve_batch(graph_type, checks, infile=sys.stdin, outfile=sys.stdout,
+		lazy=False, timing=False, trace_file=None):
+	# run_batch() reads ahead, so the requests whose results have not been
+	# written yet are kept in a queue, each with its error result if it could
+	# not be read (such requests are not passed to run_batch())
+	requests = collections.deque()
+
+	def graphs():
+		for line in infile:
+			if line.strip() == '':
+				continue
+			request = {}
+			try:
+				request = json.loads(line)
+				graph = request['graph']
+			except:
+				requests.append((request, {
+					'type': 'error',
+					'error': traceback.format_exc()
+				}))
+				continue
+			requests.append((request, None))
+			yield graph
+
+	def write(request, result):
+		if isinstance(request, dict) and 'id' in request:
+			result['id'] = request['id']
+		outfile.write(json.dumps(result) + '\n')
+		outfile.flush()
+
+	with contextlib.redirect_stdout(sys.stderr):
+		for result in run_batch(graph_type, graphs(), checks, lazy, timing, trace_file):
+			request, error = requests.popleft()
+			while error is not None:
+				write(request, error)
+				request, error = requests.popleft()
+			write(request, result)
+		while requests:
+			write(*requests.popleft())
+
+def main(args):
+	global word_workers
+	lazy = '--lazy' in args
+	timing = '--timing' in args
+	args = [a for a in args if a not in ['--lazy', '--timing']]
+	trace_file = None
+	if '--trace' in args and args.index('--trace') + 1 < len(args):
+		i = args.index('--trace')
+		trace_file = args[i + 1]
+		args = args[:i] + args[i + 2:]
+	if '--workers' in args and args.index('--workers') + 1 < len(args):
+		i = args.index('--workers')
+		word_workers = int(args[i + 1])
+		args = args[:i] + args[i + 2:]
+
+	if len(args) == 3 and args[0] == 'batch':
+		use_graph_type(args[1])
+		with open(args[2]) as f:
+			checks = f.read()
+		serve_batch(args[1], checks, outfile=sys.stdout,
+				lazy=lazy, timing=timing, trace_file=trace_file)
+	elif len(args) == 2 and args[0] == 'serve':
+		use_graph_type(args[1])
+		serve(args[1])
+	elif len(args) == 4 and args[0] == 'serve' and args[2] == '--socket':
+		use_graph_type(args[1])
+		serve_socket(args[1], args[3])
+	else:
+		print('Usage: python3 checkrunner.py serve <graph_type> [--socket <path>] [--workers <n>]')
+		print('    grades JSON-lines requests {"graph": ..., "checks": ...} from stdin')
+		print('    (or from the given Unix socket) until end of input')
+		print('   or: python3 checkrunner.py batch <graph_type> <checks_file> [--lazy] [--timing] [--trace <file>] [--workers <n>]')
+		print('    grades JSON-lines submissions {"graph": ...} from stdin against')
+		print('    the checks in <checks_file>; with --lazy, checks that cannot')
+		print('    change the grade anymore are skipped; --timing adds timings to')
+		print('    the results and --trace writes a Chrome trace of the batch')
+		print('    --workers lets checks simulate words in <n> processes in parallel')
+		sys.exit(1)
+
+if __name__ == '__main__':
+	# make sure that check modules importing checkrunner (for example, for
+	# generate_language()) share this module instead of loading another copy
+	sys.modules['checkrunner'] = sys.modules[__name__]
+	main(sys.argv[1:])
@@ -1,8 +1,9 @@
-from gambatools.notebook import parse_nfa, generate_language, parse_word_list, compare_languages, nfa_accepts_word
+from gambatools.notebook import parse_word_list
+from fsm_engine import accepts_words, accepts_words_batch, count_words
 
 def fsm_accepts(student_answer, word_list):
     try:
-        A = parse_nfa(student_answer)
+        A = student_answer.nfa()
     except RuntimeError as e:
         return {'correct': False,
                 'feedback': str(e)}
@@ -10,8 +11,9 @@ def fsm_accepts(student_answer, word_list):
     word_list = " ".join(word_list)
     words = parse_word_list(word_list)
 
+    accepted = accepts_words(A, words)
     for word in words:
-        if not nfa_accepts_word(A, word):
+        if not accepted[word]:
             return {'correct': False,
                     'feedback': 'a word was rejected',
                     'word': word}
@@ -21,7 +23,7 @@ def fsm_accepts(student_answer, word_list):
 
 def fsm_rejects(student_answer, word_list):
     try:
-        A = parse_nfa(student_answer)
+        A = student_answer.nfa()
     except RuntimeError as e:
         return {'correct': False,
                 'feedback': str(e)}
@@ -29,8 +31,9 @@ def fsm_rejects(student_answer, word_list):
     word_list = " ".join(word_list)
     words = parse_word_list(word_list)
 
+    accepted = accepts_words(A, words)
     for word in words:
-        if nfa_accepts_word(A, word):
+        if accepted[word]:
             return {'correct': False,
                     'feedback': 'a word was accepted',
                     'word': word}
@@ -38,3 +41,53 @@ def fsm_rejects(student_answer, word_list):
     return {'correct': True,
             'feedback': 'correct'}
 
+# Batch versions of fsm_accepts() and fsm_rejects(), which grade a list of
+# answers at once (see accepts_words_batch()) and return the list of results.
+def fsm_accepts_batch(student_answers, word_list):
+    return _check_words_batch(student_answers, word_list, True, 'a word was rejected')
+
+def fsm_rejects_batch(student_answers, word_list):
+    return _check_words_batch(student_answers, word_list, False, 'a word was accepted')
+
+def _check_words_batch(student_answers, word_list, expected, feedback):
+    word_list = " ".join(word_list)
+    words = list(parse_word_list(word_list))
+
+    results = [None] * len(student_answers)
+    automata = []
+    indices = []
+    for i, student_answer in enumerate(student_answers):
+        try:
+            automata.append(student_answer.nfa())
+            indices.append(i)
+        except RuntimeError as e:
+            results[i] = {'correct': False,
+                          'feedback': str(e)}
+
+    for i, accepted in zip(indices, accepts_words_batch(automata, words)):
+        if (not expected) in accepted:
+            results[i] = {'correct': False,
+                          'feedback': feedback,
+                          'word': words[accepted.index(not expected)]}
+        else:
+            results[i] = {'correct': True,
+                          'feedback': 'correct'}
+    return results
+
+
+def fsm_word_count(student_answer, length, count):
+    try:
+        A = student_answer.nfa()
+    except RuntimeError as e:
+        return {'correct': False,
+                'feedback': str(e)}
+
+    accepted = count_words(A, length)[length]
+    if accepted != count:
+        return {'correct': False,
+                'feedback': 'wrong number of words',
+                'accepted': accepted,
+                'words': 'word' if accepted == 1 else 'words'}
+
+    return {'correct': True,
+            'feedback': 'correct'}
@@ -1,17 +1,19 @@
 # Tests for DFAs.
 
-from gambatools.notebook import parse_dfa, generate_language, parse_word_list, compare_languages
+from gambatools.notebook import parse_word_list
+from fsm_engine import compare_automata, compare_word_counts, compare_with_words
 
 def check_dfa_language_from_words(student_answer, word_list, length):
     word_list = " ".join(word_list)
     try:
-        A = parse_dfa(student_answer)
+        A = student_answer.dfa()
     except RuntimeError as e:
         return {'correct': False,
                 'feedback': str(e)}
-    A_words = generate_language(A, length)
     words = parse_word_list(word_list)
-    feedback = compare_languages(A_words, words)
+    feedback = compare_word_counts(A, words, length)
+    if feedback is None:
+        feedback = compare_with_words(A, words, length)
     if len(feedback) == 0:
         return {'correct': True}
     else:
@@ -20,14 +22,12 @@ def check_dfa_language_from_words(student_answer, word_list, length):
 
 def check_dfa_language_from_answer(student_answer, other, length):
     try:
-        A = parse_dfa(student_answer)
+        A = student_answer.dfa()
     except RuntimeError as e:
         return {'correct': False,
                 'feedback': str(e)}
-    A_words = generate_language(A, length)
-    B = parse_dfa(other)
-    B_words = generate_language(B, length)
-    feedback = compare_languages(A_words, B_words)
+    B = other.dfa()
+    feedback = compare_automata(A, B, length)
     if len(feedback) == 0:
         return {'correct': True}
     else:
@@ -36,7 +36,7 @@ def check_dfa_language_from_answer(student_answer, other, length):
 
 def check_dfa_max_states(student_answer, max_states):
     try:
-        A = parse_dfa(student_answer)
+        A = student_answer.dfa()
     except RuntimeError as e:
         return {'correct': False,
                 'feedback': str(e)}
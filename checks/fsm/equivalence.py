@@ -1,15 +1,28 @@
-from gambatools.notebook import parse_nfa, generate_language, parse_word_list, compare_languages, nfa_accepts_word
+from gambatools.notebook import parse_word_list
+from fsm_engine import compare_automata, compare_word_counts, compare_with_words
 
 def language_equivalence_automaton(student_answer, other, length):
     try:
-        A = parse_nfa(student_answer)
+        A = student_answer.nfa()
     except RuntimeError as e:
         return {'correct': False,
                 'feedback': str(e)}
-    A_words = generate_language(A, length)
-    B = parse_nfa(other)
-    B_words = generate_language(B, length)
-    feedback = compare_languages(A_words, B_words)
+    B = other.nfa()
+    feedback = compare_automata(A, B, length)
+    if len(feedback) == 0:
+        return {'correct': True}
+    else:
+        return {'correct': False,
+                'feedback': " / ".join(feedback)}
+
+def language_equivalence_automaton_exact(student_answer, other):
+    try:
+        A = student_answer.nfa()
+    except RuntimeError as e:
+        return {'correct': False,
+                'feedback': str(e)}
+    B = other.nfa()
+    feedback = compare_automata(A, B)
     if len(feedback) == 0:
         return {'correct': True}
     else:
@@ -19,13 +32,14 @@ def language_equivalence_automaton(student_answer, other, length):
 def language_equivalence_words(student_answer, word_list, length):
     word_list = " ".join(word_list)
     try:
-        A = parse_nfa(student_answer)
+        A = student_answer.nfa()
     except RuntimeError as e:
         return {'correct': False,
                 'feedback': str(e)}
-    A_words = generate_language(A, length)
     words = parse_word_list(word_list)
-    feedback = compare_languages(A_words, words)
+    feedback = compare_word_counts(A, words, length)
+    if feedback is None:
+        feedback = compare_with_words(A, words, length)
     if len(feedback) == 0:
         return {'correct': True}
     else:
@@ -0,0 +1,500 @@
+# Fast algorithms on finite automata, working on the DFA and NFA objects
+# produced by gambatools' parse_dfa() and parse_nfa().
+#
+# An automaton is first compiled into a CompiledAutomaton, in which states are
+# numbered and sets of states are represented by integer bitmasks. Every set of
+# states that is reached is cached as a state of a DFA, together with its
+# outgoing transitions, so this DFA is built lazily (only the part that is
+# actually needed).
+
+from collections import deque, defaultdict, namedtuple
+
+
+class CompiledAutomaton:
+    def __init__(self, A):
+        epsilon = getattr(A, 'epsilon', None)
+        states = list(A.Q | {A.q0})
+        index = {q: i for i, q in enumerate(states)}
+
+        # successors[i][a] is the bitmask of the a-successors of state i
+        successors = [defaultdict(int) for q in states]
+        for (q, a), targets in A.delta.items():
+            if epsilon is None:
+                targets = [targets]
+            for q1 in targets:
+                successors[index[q]][a] |= 1 << index[q1]
+
+        # closures[i] is the bitmask of the epsilon-closure of state i
+        closures = []
+        for i in range(len(states)):
+            closure = 1 << i
+            todo = [i]
+            while todo:
+                j = todo.pop()
+                new = successors[j].get(epsilon, 0) & ~closure
+                closure |= new
+                todo.extend(_bits(new))
+            closures.append(closure)
+
+        # moves[a][i] is the bitmask of the epsilon-closure of the a-successors
+        # of state i
+        self.moves = defaultdict(dict)
+        for i, succ in enumerate(successors):
+            for a, mask in succ.items():
+                self.moves[a][i] = _union(closures, mask)
+
+        self.symbols = sorted(A.Sigma)
+        self.alphabet = set(A.Sigma)
+        self.initial = closures[index[A.q0]]
+        self.final = 0
+        for q in A.F:
+            if q in index:
+                self.final |= 1 << index[q]
+        self.transitions = {}
+
+    # Returns the set of states that can be reached from subset by reading
+    # symbol a.
+    def step(self, subset, a):
+        transitions = self.transitions.get(subset)
+        if transitions is None:
+            transitions = self.transitions[subset] = {}
+        result = transitions.get(a)
+        if result is None:
+            result = _union(self.moves.get(a, {}), subset)
+            transitions[a] = result
+        return result
+
+    def is_accepting(self, subset):
+        return subset & self.final != 0
+
+    def accepts(self, word):
+        subset = self.initial
+        for a in word:
+            if not subset:
+                break
+            subset = self.step(subset, a)
+        return self.is_accepting(subset)
+
+# Returns the indices of the bits that are set in mask.
+def _bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+# Returns the union of masks[i] for all i in subset (where masks may be a list
+# or a dictionary with missing entries).
+def _union(masks, subset):
+    result = 0
+    if isinstance(masks, dict):
+        for i in _bits(subset):
+            result |= masks.get(i, 0)
+    else:
+        for i in _bits(subset):
+            result |= masks[i]
+    return result
+
+
+# Returns the compiled version of automaton A, which is stored with A so that
+# the lazily built DFA is shared between all uses of A.
+def compile_automaton(A):
+    compiled = getattr(A, '_compiled', None)
+    if compiled is None:
+        compiled = A._compiled = CompiledAutomaton(A)
+    return compiled
+
+
+# Returns a dictionary that maps each of the given words to whether A accepts
+# it. The words are put in a trie, which is walked depth-first while carrying
+# the set of states A can be in, so that every common prefix is simulated only
+# once.
+def accepts_words(A, words):
+    C = compile_automaton(A)
+    trie = {}
+    for word in words:
+        node = trie
+        for a in word:
+            node = node.setdefault(a, {})
+        node[None] = word
+    result = {}
+    todo = [(trie, C.initial)]
+    while todo:
+        node, subset = todo.pop()
+        for a, child in node.items():
+            if a is None:
+                result[child] = C.is_accepting(subset)
+            else:
+                todo.append((child, C.step(subset, a) if subset else subset))
+    return result
+
+
+# Returns, for each of the given automata, a list containing for each of the
+# given words (in order) whether that automaton accepts it. This is meant for
+# grading the answers of a whole class at once: the automata are determinized
+# and packed into one NumPy array table[s, q, c] holding the successor of state
+# q of automaton s on the c-th symbol, padded with a shared dead state, and then
+# every word is run on all automata at the same time, one symbol position per
+# array operation. An extra padding symbol on which every state stays where it
+# is makes all words equally long. Automata whose determinized version has more
+# than max_states states (and all automata, if NumPy is not available) are
+# handled one by one by accepts_words() instead.
+def accepts_words_batch(automata, words, max_states=256):
+    words = list(words)
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+    tables = {}
+    if numpy is not None:
+        for s, A in enumerate(automata):
+            D = determinize(A, max_states)
+            if D is not None:
+                tables[s] = D
+
+    result = [None] * len(automata)
+    for s, A in enumerate(automata):
+        if s not in tables:
+            accepted = accepts_words(A, words)
+            result[s] = [accepted[word] for word in words]
+    if not tables:
+        return result
+
+    symbols = sorted({a for word in words for a in word})
+    column = {a: c for c, a in enumerate(symbols)}
+    padding = len(symbols)
+    dead = max(D.size for D in tables.values())
+    packed = list(tables)
+    table = numpy.full((len(packed), dead + 1, padding + 1), dead, dtype=numpy.int32)
+    table[:, :, padding] = numpy.arange(dead + 1)
+    final = numpy.zeros((len(packed), dead + 1), dtype=bool)
+    for row, s in enumerate(packed):
+        D = tables[s]
+        used = [i for i, a in enumerate(D.symbols) if a in column]
+        if used:
+            transitions = numpy.array(D.transitions, dtype=numpy.int32)
+            table[row, :D.size][:, [column[D.symbols[i]] for i in used]] = transitions[:, used]
+        final[row, list(D.final)] = True
+
+    length = max((len(word) for word in words), default=0)
+    encoded = numpy.full((len(words), length), padding, dtype=numpy.int32)
+    for j, word in enumerate(words):
+        encoded[j, :len(word)] = [column[a] for a in word]
+
+    rows = numpy.arange(len(packed))[:, None]
+    states = numpy.zeros((len(packed), len(words)), dtype=numpy.int32)
+    for i in range(length):
+        states = table[rows, states, encoded[:, i]]
+    accepted = final[rows, states].tolist()
+    for row, s in enumerate(packed):
+        result[s] = accepted[row]
+    return result
+
+
+# The structure of an automaton given by its initial states, accepting states and
+# transitions (p, q, a) as in the preprocessed answer, computed in linear time
+# without building a gambatools automaton. Like gambatools, the states are the
+# states that are initial, accepting or used in a transition (here in the order
+# in which they first occur), and the symbols are the transition labels. The
+# attributes are
+# * table: maps each state to a dict mapping each symbol to the list of targets
+#   of its transitions on that symbol;
+# * nondeterministic: the (state, symbol) pairs with more than one transition;
+# * missing: the (state, symbol) pairs without a transition;
+# * unreachable: the states that cannot be reached from an initial state;
+# * dead: the states from which no accepting state can be reached.
+class Structure:
+    def __init__(self, initial_states, final_states, transitions):
+        self.initial_states = list(initial_states)
+        self.final_states = list(final_states)
+        self.table = {}
+        for q in self.initial_states + self.final_states:
+            self.table.setdefault(q, {})
+        predecessors = defaultdict(list)
+        for (p, q, a) in transitions:
+            self.table.setdefault(p, {}).setdefault(a, []).append(q)
+            self.table.setdefault(q, {})
+            predecessors[q].append(p)
+        self.states = list(self.table)
+        self.symbols = sorted({a for (_, _, a) in transitions})
+
+        self.nondeterministic = []
+        self.missing = []
+        for q in self.states:
+            row = self.table[q]
+            for a in self.symbols:
+                if a not in row:
+                    self.missing.append((q, a))
+                elif len(row[a]) > 1:
+                    self.nondeterministic.append((q, a))
+
+        successors = {q: [q1 for targets in row.values() for q1 in targets]
+                      for q, row in self.table.items()}
+        reachable = _search(self.initial_states, successors)
+        self.unreachable = [q for q in self.states if q not in reachable]
+        productive = _search(self.final_states, predecessors)
+        self.dead = [q for q in self.states if q not in productive]
+
+    def is_deterministic(self):
+        return len(self.initial_states) == 1 and not self.nondeterministic and not self.missing
+
+
+# Returns the set of nodes that can be reached from the given nodes, where
+# edges[q] is the list of nodes that have an edge from q.
+def _search(start, edges):
+    seen = set(start)
+    todo = list(seen)
+    while todo:
+        q = todo.pop()
+        for q1 in edges.get(q, []):
+            if q1 not in seen:
+                seen.add(q1)
+                todo.append(q1)
+    return seen
+
+
+# A DFA with states 0, ..., size - 1, of which 0 is the initial state, where
+# transitions[q][i] is the successor of state q on symbols[i], and final is the
+# set of accepting states.
+DFATable = namedtuple('DFATable', ['size', 'symbols', 'transitions', 'final'])
+
+
+# Returns the reachable part of the subset construction of A (which for a DFA
+# is just its reachable part) as a DFATable. If it is reachable, the empty set
+# of states is included as a (non-accepting) state, so the result is total. If
+# max_size is given and the result would have more states, returns None.
+def determinize(A, max_size=None):
+    C = compile_automaton(A)
+    index = {C.initial: 0}
+    subsets = [C.initial]
+    transitions = []
+    for subset in subsets:
+        row = []
+        for a in C.symbols:
+            subset1 = C.step(subset, a)
+            if subset1 not in index:
+                if max_size is not None and len(subsets) == max_size:
+                    return None
+                index[subset1] = len(subsets)
+                subsets.append(subset1)
+            row.append(index[subset1])
+        transitions.append(row)
+    final = {q for q, subset in enumerate(subsets) if C.is_accepting(subset)}
+    return DFATable(len(subsets), C.symbols, transitions, final)
+
+
+# Computes the coarsest partition of the states of the total DFA D that is
+# compatible with its transitions and accepting states, using Hopcroft's
+# algorithm (which takes O(n k log n) time for n states and k symbols).
+# Returns a list that maps each state to the index of its block.
+def _hopcroft(D):
+    n = D.size
+    k = len(D.symbols)
+    inverse = [[[] for q in range(n)] for i in range(k)]
+    for q in range(n):
+        for i in range(k):
+            inverse[i][D.transitions[q][i]].append(q)
+
+    blocks = [block for block in (set(D.final), set(range(n)) - D.final) if block]
+    block_of = [0] * n
+    for b, block in enumerate(blocks):
+        for q in block:
+            block_of[q] = b
+    waiting = set()
+    if len(blocks) == 2:
+        smallest = 0 if len(blocks[0]) <= len(blocks[1]) else 1
+        waiting = {(smallest, i) for i in range(k)}
+
+    while waiting:
+        b, i = waiting.pop()
+        touched = defaultdict(set)
+        for q in blocks[b]:
+            for p in inverse[i][q]:
+                touched[block_of[p]].add(p)
+        for c, inside in touched.items():
+            if len(inside) == len(blocks[c]):
+                continue
+            outside = blocks[c] - inside
+            blocks[c] = inside
+            new = len(blocks)
+            blocks.append(outside)
+            for q in outside:
+                block_of[q] = new
+            smaller = c if len(inside) <= len(outside) else new
+            for j in range(k):
+                if (c, j) in waiting:
+                    waiting.add((new, j))
+                else:
+                    waiting.add((smaller, j))
+    return block_of
+
+
+# Returns the minimal (total) DFA accepting the same language as A, as a
+# DFATable. The result is stored with A, so that for a reference automaton that
+# is shared between answers, it is computed only once.
+def minimize(A):
+    minimal = getattr(A, '_minimal', None)
+    if minimal is None:
+        D = determinize(A)
+        block_of = _hopcroft(D)
+        renumber = {}
+        for q in range(D.size):
+            renumber.setdefault(block_of[q], len(renumber))
+        transitions = [None] * len(renumber)
+        for q in range(D.size):
+            transitions[renumber[block_of[q]]] = [renumber[block_of[q1]] for q1 in D.transitions[q]]
+        final = {renumber[block_of[q]] for q in D.final}
+        minimal = A._minimal = DFATable(len(renumber), D.symbols, transitions, final)
+    return minimal
+
+
+# Returns a list containing, for each length 0, ..., length, the number of
+# words of that length that A accepts. Like words(), this goes level by level
+# over the sets of states of the lazily built DFA, but instead of the words that
+# reach each set it only keeps their number, so only the sets that are actually
+# reached within the length are built.
+def count_words(A, length):
+    C = compile_automaton(A)
+    counts = []
+    level = {C.initial: 1}
+    for n in range(length + 1):
+        counts.append(sum(count for subset, count in level.items() if C.is_accepting(subset)))
+        if n == length:
+            break
+        next_level = defaultdict(int)
+        for subset, count in level.items():
+            for a in C.symbols:
+                subset1 = C.step(subset, a)
+                if subset1:
+                    next_level[subset1] += count
+        level = next_level
+    return counts
+
+
+# Compares the number of words of each length up to the given length that A
+# accepts with the number of such words in the given set. Returns None if all
+# counts are equal (in which case the languages may or may not be equal), and
+# otherwise a list containing a feedback message for the shortest length where
+# they differ.
+def compare_word_counts(A, words, length):
+    expected = [0] * (length + 1)
+    for word in words:
+        if len(word) <= length:
+            expected[len(word)] += 1
+    counts = count_words(A, length)
+    for n in range(length + 1):
+        if counts[n] != expected[n]:
+            return ["Error: the automaton accepts {} {} of length {}, but should accept {}".format(
+                    counts[n], "word" if counts[n] == 1 else "words", n, expected[n])]
+    return None
+
+
+# Searches for the shortest words on which A and B disagree, by a breadth-first
+# search over the product of the subset constructions of A and B. If length is
+# not None, only words of at most that length are considered.
+#
+# Returns None if A and B accept the same words. Otherwise returns a pair
+# (word, accepted_by_A): if there is a word accepted by A but not by B, it is
+# the shortest such word, and otherwise the shortest word accepted by B but not
+# by A. (This is the same preference as gambatools' compare_languages().)
+def shortest_difference(A, B, length=None):
+    CA = compile_automaton(A)
+    CB = compile_automaton(B)
+    symbols = sorted(set(CA.symbols) | set(CB.symbols))
+    start = (CA.initial, CB.initial)
+    visited = {start}
+    queue = deque([(start, '')])
+    missing = None
+    while queue:
+        (P, Q), word = queue.popleft()
+        accepted_A = CA.is_accepting(P)
+        accepted_B = CB.is_accepting(Q)
+        if accepted_A and not accepted_B:
+            return (word, True)
+        if accepted_B and not accepted_A and missing is None:
+            missing = word
+        if length is not None and len(word) >= length:
+            continue
+        for a in symbols:
+            pair = (CA.step(P, a) if a in CA.alphabet else 0,
+                    CB.step(Q, a) if a in CB.alphabet else 0)
+            if pair not in visited:
+                visited.add(pair)
+                queue.append((pair, word + a))
+    if missing is not None:
+        return (missing, False)
+    return None
+
+
+# Compares the words of at most the given length that A (the student answer)
+# accepts with the given set of words (the expected answer), like
+# compare_languages(generate_language(A, length), words) does, but without
+# enumerating the language of A. Instead, the words (of at most the given
+# length) are put in a trie, which is an acyclic DFA, and the product of this
+# trie and the subset construction of A is searched breadth-first for the
+# shortest word accepted by one but not the other.
+def compare_with_words(A, words, length):
+    C = compile_automaton(A)
+    trie = {}
+    longer = []
+    for word in words:
+        if len(word) > length:
+            longer.append(word)
+            continue
+        node = trie
+        for a in word:
+            node = node.setdefault(a, {})
+        node[None] = word
+
+    # a node of None means that the word read so far is not a prefix of any
+    # of the words
+    start = (trie, C.initial)
+    queue = deque([(start, '')])
+    visited = set()
+    missing = None
+    while queue:
+        (node, subset), word = queue.popleft()
+        expected = node is not None and None in node
+        if C.is_accepting(subset) and not expected:
+            return _word_feedback(word, True)
+        if expected and not C.is_accepting(subset) and missing is None:
+            missing = word
+        if len(word) >= length:
+            continue
+        symbols = set(C.alphabet)
+        if node is not None:
+            symbols.update(a for a in node if a is not None)
+        for a in sorted(symbols):
+            child = node.get(a) if node is not None else None
+            subset1 = C.step(subset, a) if subset and a in C.alphabet else 0
+            if child is None:
+                if not subset1 or subset1 in visited:
+                    continue
+                visited.add(subset1)
+            queue.append(((child, subset1), word + a))
+    if missing is None and longer:
+        missing = min(longer, key=len)
+    if missing is not None:
+        return _word_feedback(missing, False)
+    return []
+
+
+# Compares the languages of automata A (the student answer) and B (the expected
+# answer). Returns a list of feedback messages in the same format as gambatools'
+# compare_languages(), which is empty if the languages are equal (up to the
+# given length, if length is not None).
+def compare_automata(A, B, length=None):
+    difference = shortest_difference(A, B, length)
+    if difference is None:
+        return []
+    return _word_feedback(*difference)
+
+
+# Returns the feedback of compare_languages() for the given word, which is
+# accepted but should not be, or the other way around.
+def _word_feedback(word, accepted):
+    word = 'ε' if not word else word
+    if accepted:
+        return ["Error: word '{}' should not be accepted".format(word)]
+    return ["Error: word '{}' should be accepted".format(word)]
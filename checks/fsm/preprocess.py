@@ -1,10 +1,61 @@
 import json
+from gambatools.automaton import Automaton
+
+# The preprocessed answer. The gambatools NFA and DFA objects are built directly
+# from the states and transitions (without going through the text format) the
+# first time a check asks for them, and are then shared by all checks. Building
+# fails with a RuntimeError, like parse_nfa() and parse_dfa() do. The structure
+# of the answer (see structure()) is computed and shared in the same way.
+class FSMAnswer:
+    def __init__(self, initial_states, final_states, transitions):
+        self.initial_states = initial_states
+        self.final_states = final_states
+        self.transitions = transitions
+        self.automaton = Automaton(set(), [(p, a, q) for (p, q, a) in transitions],
+                set(initial_states), set(final_states), {})
+        self.built = {}
+        self.analysis = None
+
+    def _build(self, builder):
+        if builder not in self.built:
+            try:
+                self.built[builder] = (builder(self.automaton), None)
+            except RuntimeError as e:
+                self.built[builder] = (None, e)
+        result, error = self.built[builder]
+        if error is not None:
+            raise error.with_traceback(None)
+        return result
+
+    def nfa(self):
+        from gambatools.nfa_algorithms import automaton_to_nfa
+        return self._build(automaton_to_nfa)
+
+    def dfa(self):
+        from gambatools.dfa_algorithms import automaton_to_dfa
+        return self._build(automaton_to_dfa)
+
+    # Returns the Structure of the answer (see fsm_engine.py), which does not
+    # need the gambatools automaton.
+    def structure(self):
+        if self.analysis is None:
+            from fsm_engine import Structure
+            self.analysis = Structure(self.initial_states, self.final_states, self.transitions)
+        return self.analysis
+
+    # Returns the answer in the text format of gambatools.
+    def text(self):
+        lines = ["initial " + label for label in self.initial_states]
+        if len(self.final_states) > 0:
+            lines.append("final " + " ".join(self.final_states))
+        for (p, q, a) in self.transitions:
+            lines.append(p + " " + q + " " + a)
+        return "".join(line + "\n" for line in lines)
 
 def preprocess(graph):
     graph = json.loads(graph)
 
-    text = ""
-
+    initial_states = []
     final_states = []
     state_labels_seen = set()
     for state in graph['vertices']:
@@ -15,25 +66,29 @@ def preprocess(graph):
             raise Exception("Automaton contains duplicate state '" + label + "'")
         state_labels_seen.add(label)
         if state['initial']:
-            text += "initial " + state['label'] + "\n"
+            initial_states.append(state['label'])
         if state['final']:
             final_states.append(state['label'])
-    if len(final_states) > 0:
-        text += "final " + " ".join(final_states) + "\n"
 
+    transitions = []
     for transition in graph['edges']:
         if transition['from'] == -1:
             continue  # ignore the initial edge
-        
+
         if (not 'label' in transition) or (transition['label'] == ''):
             raise Exception("Automaton contains a transition without a label")
-        
+
         p = graph['vertices'][transition['from']]['label']
         q = graph['vertices'][transition['to']]['label']
         a = transition['label']
 
         if len(a) != 1:
             raise Exception('Invalid transition label "' + a + '" (each transition should be labeled by a single letter, denoting the input symbol it consumes)')
-        text += p + " " + q + " " + a + "\n"
+        transitions.append((p, q, a))
+
+    return FSMAnswer(initial_states, final_states, transitions)
 
-    return text
+# Custom checks get the answer in the text format of gambatools, so that they
+# can use parse_nfa() and parse_dfa() on it.
+def custom_check_answer(answer):
+    return answer.text()
@@ -1,10 +1,10 @@
 # Tests for DFAs.
 
-from gambatools.notebook import parse_dfa, parse_nfa
+from fsm_engine import minimize
 
 def state_count(student_answer, max_states):
     try:
-        A = parse_nfa(student_answer)
+        A = student_answer.nfa()
     except RuntimeError as e:
         return {'correct': False,
                 'feedback': str(e)}
@@ -17,11 +17,86 @@ def state_count(student_answer, max_states):
                         str(max_states) + " allowed)"}
 
 def deterministic(student_answer):
+    S = student_answer.structure()
+    if not S.is_deterministic():
+        return {'correct': False,
+                'feedback': " / ".join(_determinism_problems(S))}
+
+    # the structure is fine, but gambatools may still reject the labels
     try:
-        A = parse_dfa(student_answer)
+        A = student_answer.dfa()
     except RuntimeError as e:
         return {'correct': False,
                 'feedback': str(e)}
 
     return {'correct': True}
 
+# Returns a message for each state in which the automaton is not deterministic
+# or not total, in the style of gambatools' messages.
+def _determinism_problems(S):
+    problems = []
+    if len(S.initial_states) == 0:
+        problems.append('the automaton has no initial state')
+    elif len(S.initial_states) > 1:
+        problems.append('the automaton has multiple initial states')
+    for pairs, message in ((S.nondeterministic, 'the automaton is not deterministic in node {} (multiple transitions on {})'),
+                           (S.missing, 'the automaton is not total in node {} (no transition on {})')):
+        symbols = {}
+        for (q, a) in pairs:
+            symbols.setdefault(q, []).append(a)
+        for q, q_symbols in symbols.items():
+            problems.append(message.format(q, ", ".join(q_symbols)))
+    return problems
+
+def reachable(student_answer):
+    unreachable = student_answer.structure().unreachable
+    if len(unreachable) == 0:
+        return {'correct': True}
+    else:
+        return {'correct': False,
+                'feedback': "The following states cannot be reached from the initial state: " +
+                        ", ".join(unreachable)}
+
+def productive(student_answer):
+    dead = student_answer.structure().dead
+    if len(dead) == 0:
+        return {'correct': True}
+    else:
+        return {'correct': False,
+                'feedback': "From the following states no accepting state can be reached: " +
+                        ", ".join(dead)}
+
+
+def minimal(student_answer, extra_states):
+    try:
+        A = student_answer.dfa()
+    except RuntimeError as e:
+        return {'correct': False,
+                'feedback': str(e)}
+    num_states = len(A.Q)
+    minimal_states = minimize(A).size
+    if num_states <= minimal_states + extra_states:
+        return {'correct': True}
+    elif extra_states == 0:
+        return {'correct': False,
+                'feedback': "Your DFA is not minimal (the minimal DFA for its language has " +
+                        str(minimal_states) + " states)"}
+    else:
+        return {'correct': False,
+                'feedback': "You used too many states (at most " +
+                        str(minimal_states + extra_states) + " allowed)"}
+
+def minimal_state_count(student_answer, other, extra_states):
+    try:
+        A = student_answer.nfa()
+    except RuntimeError as e:
+        return {'correct': False,
+                'feedback': str(e)}
+    num_states = len(A.Q)
+    max_states = minimize(other.nfa()).size + extra_states
+    if num_states <= max_states:
+        return {'correct': True}
+    else:
+        return {'correct': False,
+                'feedback': "You used too many states (at most " +
+                        str(max_states) + " allowed)"}
@@ -1,8 +1,9 @@
-from gambatools.notebook import parse_pda, generate_language, parse_word_list, compare_languages, pda_accepts_word
+from gambatools.notebook import parse_word_list
+from pda_grammar import pda_grammar
 
 def pda_accepts(student_answer, word_list):
     try:
-        A = parse_pda(student_answer)
+        A = student_answer.pda()
     except RuntimeError as e:
         return {'correct': False,
                 'feedback': str(e)}
@@ -10,8 +11,9 @@ def pda_accepts(student_answer, word_list):
     word_list = " ".join(word_list)
     words = parse_word_list(word_list)
 
-    for word in words:
-        if not pda_accepts_word(A, word):
+    accepted = pda_grammar(A).accepts_words(words)
+    for word, word_accepted in zip(words, accepted):
+        if not word_accepted:
             return {'correct': False,
                     'feedback': 'a word was rejected',
                     'word': word}
@@ -21,7 +23,7 @@ def pda_accepts(student_answer, word_list):
 
 def pda_rejects(student_answer, word_list):
     try:
-        A = parse_pda(student_answer)
+        A = student_answer.pda()
     except RuntimeError as e:
         return {'correct': False,
                 'feedback': str(e)}
@@ -29,12 +31,12 @@ def pda_rejects(student_answer, word_list):
     word_list = " ".join(word_list)
     words = parse_word_list(word_list)
 
-    for word in words:
-        if pda_accepts_word(A, word):
+    accepted = pda_grammar(A).accepts_words(words)
+    for word, word_accepted in zip(words, accepted):
+        if word_accepted:
             return {'correct': False,
                     'feedback': 'a word was accepted',
                     'word': word}
 
     return {'correct': True,
             'feedback': 'correct'}
-
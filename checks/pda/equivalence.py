@@ -1,14 +1,21 @@
-from gambatools.notebook import parse_pda, generate_language, parse_word_list, compare_languages, pda_accepts_word
+from gambatools.notebook import parse_word_list, compare_languages
+from checkrunner import generate_language
+from pda_grammar import pda_grammar
+
+# Returns the set of words of at most the given length that P accepts, like
+# gambatools' pda_words_up_to_n(), deciding them with the grammar of P.
+def _accepted_words(P, length):
+    return pda_grammar(P).words_up_to(length)
 
 def language_equivalence_automaton(student_answer, other, length):
     try:
-        A = parse_pda(student_answer)
+        A = student_answer.pda()
     except RuntimeError as e:
         return {'correct': False,
                 'feedback': str(e)}
-    A_words = generate_language(A, length)
-    B = parse_pda(other)
-    B_words = generate_language(B, length)
+    A_words = generate_language(A, length, _accepted_words)
+    B = other.pda()
+    B_words = generate_language(B, length, _accepted_words)
     feedback = compare_languages(A_words, B_words)
     if len(feedback) == 0:
         return {'correct': True}
@@ -19,11 +26,11 @@ def language_equivalence_automaton(student_answer, other, length):
 def language_equivalence_words(student_answer, word_list, length):
     word_list = " ".join(word_list)
     try:
-        A = parse_pda(student_answer)
+        A = student_answer.pda()
     except RuntimeError as e:
         return {'correct': False,
                 'feedback': str(e)}
-    A_words = generate_language(A, length)
+    A_words = generate_language(A, length, _accepted_words)
     words = parse_word_list(word_list)
     feedback = compare_languages(A_words, words)
     if len(feedback) == 0:
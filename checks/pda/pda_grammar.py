@@ -0,0 +1,312 @@
+# Conversion of pushdown automata into context-free grammars in Chomsky normal
+# form, and CYK membership for lists of words, working on the PDA objects
+# produced by gambatools' parse_pda().
+#
+# The grammar generates exactly the words that the PDA accepts with the
+# semantics of gambatools' pda_accepts_word(): the stack starts empty, each
+# transition pops at most one symbol and pushes at most one symbol, and a word
+# is accepted if an accepting state can be reached after reading it (regardless
+# of the stack). Unlike simulating the PDA, deciding membership with the grammar
+# always takes polynomial time in the length of the word and the size of the
+# PDA, no matter how the PDA uses its stack.
+#
+# The grammar has a variable [p, q] for each pair of states p and q, which
+# generates the words that can be read going from p to q such that the stack
+# ends as it started, without popping below its starting height; and a
+# variable [p] for each state p, which generates the words that can be read
+# going from p to an accepting state, without popping below the starting
+# height. Since the stack starts empty, the start variable is [q0]. Each
+# pushed symbol is either popped again later, in which case the push and the
+# pop are matched inside some [p, q], or it stays on the stack, which [p]
+# allows:
+#
+#   [p, p] -> ε
+#   [p, q] -> a                    for a transition p -> q that reads a
+#                                  (which may be ε) and leaves the stack alone
+#   [p, q] -> [p, r] [r, q]
+#   [p, q] -> a [r, s] b           for a transition p -> r that reads a and
+#                                  pushes x, and a transition s -> q that
+#                                  reads b and pops x
+#   [p]    -> ε                    for an accepting state p
+#   [p]    -> [p, r] [r]
+#   [p]    -> a [r]                for a transition p -> r that reads a and
+#                                  pushes a symbol
+#
+# A transition that pops x and pushes y is first split into one that pops x,
+# followed by an ε transition that pushes y, via a new state. Only the pairs
+# [p, q] for which the PDA can actually go from p to q are used.
+
+from collections import defaultdict
+
+
+class CNFGrammar:
+    def __init__(self, P):
+        epsilon = P.epsilon
+        self.symbols = sorted(P.Sigma)
+
+        # the states are numbered from 0 (the initial state), and the stack
+        # symbols from 1, with 0 standing for ε
+        states = [P.q0] + sorted(P.Q - {P.q0})
+        index = {q: i for i, q in enumerate(states)}
+        codes = {a: i + 1 for i, a in enumerate(sorted(P.Gamma))}
+        codes[epsilon] = 0
+        final = {index[q] for q in P.F}
+
+        # transitions that leave the stack alone, push, and pop, as lists of
+        # (p, a, x, q), where x is the stack symbol (if any) and a is the list
+        # of words the transition can read: gambatools' simulation also lets
+        # ε transitions read the ε symbol itself
+        neutral = []
+        push = []
+        pop = []
+        num_states = len(states)
+        for (p, a, u), targets in sorted(P.delta.items()):
+            p = index[p]
+            a = [(), (epsilon,)] if a == epsilon else [(a,)]
+            u = codes[u]
+            for (q, v) in sorted(targets):
+                q = index[q]
+                v = codes[v]
+                if u == 0 and v == 0:
+                    neutral.append((p, a, 0, q))
+                elif u == 0:
+                    push.append((p, a, v, q))
+                elif v == 0:
+                    pop.append((p, a, u, q))
+                else:
+                    pop.append((p, a, u, num_states))
+                    push.append((num_states, [()], v, q))
+                    num_states += 1
+
+        # matched[p] is the set of states q for which [p, q] is used
+        matched = [{p} for p in range(num_states)]
+        pops = defaultdict(list)
+        for (s, b, x, q) in pop:
+            pops[x].append((s, b, q))
+        todo = [(p, q) for (p, a, x, q) in neutral] + [(p, p) for p in range(num_states)]
+        for (p, q) in todo:
+            matched[p].add(q)
+        while todo:
+            p, q = todo.pop()
+            new = [(p, q1) for q1 in matched[q]]
+            new += [(p1, q) for p1 in range(num_states) if p in matched[p1]]
+            for (p1, a, x, r) in push:
+                if r == p:
+                    new += [(p1, q1) for (s, b, q1) in pops[x] if s == q]
+            for (p1, q1) in new:
+                if q1 not in matched[p1]:
+                    matched[p1].add(q1)
+                    todo.append((p1, q1))
+
+        # the rules, as lists of (head, body), where a body is a tuple of
+        # variables (ints) and terminals (strings)
+        variables = {}
+
+        def variable(key):
+            if key not in variables:
+                variables[key] = len(variables)
+            return variables[key]
+
+        start = variable(0)
+        rules = []
+        for p in range(num_states):
+            rules.append((variable((p, p)), ()))
+            for r in matched[p]:
+                for q in matched[r]:
+                    rules.append((variable((p, q)), (variable((p, r)), variable((r, q)))))
+                rules.append((variable(p), (variable((p, r)), variable(r))))
+            if p in final:
+                rules.append((variable(p), ()))
+        for (p, a, x, q) in neutral:
+            for body in a:
+                rules.append((variable((p, q)), body))
+        for (p, a, x, r) in push:
+            for body in a:
+                rules.append((variable(p), body + (variable(r),)))
+            for (s, b, q) in pops[x]:
+                if s in matched[r]:
+                    for left in a:
+                        for right in b:
+                            rules.append((variable((p, q)), left + (variable((r, s)),) + right))
+
+        # keep only the variables that are reachable from the start variable
+        # and generate some word
+        by_body = defaultdict(list)
+        for i, (head, body) in enumerate(rules):
+            for x in body:
+                if isinstance(x, int):
+                    by_body[x].append(i)
+        missing = [sum(1 for x in body if isinstance(x, int)) for (head, body) in rules]
+        productive = set()
+        todo = [head for (head, body), count in zip(rules, missing) if count == 0]
+        while todo:
+            A = todo.pop()
+            if A in productive:
+                continue
+            productive.add(A)
+            for i in by_body[A]:
+                missing[i] -= 1
+                if missing[i] == 0:
+                    todo.append(rules[i][0])
+        rules = [(head, body) for (head, body) in rules
+                 if head in productive and all(x in productive for x in body if isinstance(x, int))]
+        by_head = defaultdict(list)
+        for (head, body) in rules:
+            by_head[head].append(body)
+        reachable = {start} if start in productive else set()
+        todo = list(reachable)
+        while todo:
+            A = todo.pop()
+            for body in by_head[A]:
+                for x in body:
+                    if isinstance(x, int) and x not in reachable:
+                        reachable.add(x)
+                        todo.append(x)
+        rules = [(head, body) for (head, body) in rules if head in reachable]
+
+        # bring the rules into Chomsky normal form: terminals in longer bodies
+        # get their own variable, bodies of length 3 are split, and the ε
+        # rules and the unit rules are removed
+        def terminal_variable(a):
+            if ('terminal', a) not in variables:
+                rules.append((variable(('terminal', a)), (a,)))
+            return variables[('terminal', a)]
+
+        for i in range(len(rules)):
+            head, body = rules[i]
+            if len(body) > 1:
+                body = tuple(terminal_variable(x) if isinstance(x, str) else x for x in body)
+            if len(body) == 3:
+                if ('rest',) + body[1:] not in variables:
+                    rules.append((variable(('rest',) + body[1:]), body[1:]))
+                body = (body[0], variables[('rest',) + body[1:]])
+            rules[i] = (head, body)
+
+        nullable = set()
+        changed = True
+        while changed:
+            changed = False
+            for (head, body) in rules:
+                if head not in nullable and all(x in nullable for x in body):
+                    nullable.add(head)
+                    changed = True
+
+        units = defaultdict(set)  # units[B] is the set of A with a rule A -> B
+        binary = []
+        terminal = []
+        for (head, body) in rules:
+            if len(body) == 2:
+                binary.append((head, body[0], body[1]))
+                if body[0] in nullable:
+                    units[body[1]].add(head)
+                if body[1] in nullable:
+                    units[body[0]].add(head)
+            elif len(body) == 1 and isinstance(body[0], int):
+                units[body[0]].add(head)
+            elif len(body) == 1:
+                terminal.append((head, body[0]))
+
+        # derivers[B] is the set of variables A that derive B using unit rules
+        # (including B itself), as a bit mask
+        derivers = {}
+
+        def deriving(B):
+            if B not in derivers:
+                mask = 1 << B
+                todo = [B]
+                while todo:
+                    for A in units[todo.pop()]:
+                        if not mask >> A & 1:
+                            mask |= 1 << A
+                            todo.append(A)
+                derivers[B] = mask
+            return derivers[B]
+
+        # the grammar in Chomsky normal form, with the rules A -> B C for all
+        # A in the mask right[B][C] and A -> a for all A in the mask
+        # terminals[a], with sets of variables represented as bit masks
+        self.right = defaultdict(lambda: defaultdict(int))
+        self.terminals = defaultdict(int)
+        for (A, B, C) in binary:
+            self.right[B][C] |= deriving(A)
+        for (A, a) in terminal:
+            self.terminals[a] |= deriving(A)
+        self.right = {B: list(row.items()) for B, row in self.right.items()}
+        self.start = start
+        self.accepts_empty = start in nullable
+
+        # the sets of variables that derive substrings and pairs of sets seen
+        # so far, which are shared by all words
+        self.derived = {}
+        self.combined = {}
+
+    # Returns the set of variables A with a rule A -> B C for some B in left
+    # and C in right.
+    def _combine(self, left, right):
+        key = (left, right)
+        result = self.combined.get(key)
+        if result is None:
+            result = 0
+            while left:
+                lowest = left & -left
+                for (C, heads) in self.right.get(lowest.bit_length() - 1, ()):
+                    if right >> C & 1:
+                        result |= heads
+                left ^= lowest
+            self.combined[key] = result
+        return result
+
+    # Returns the set of variables that derive the nonempty word, using the CYK
+    # algorithm. The sets for all substrings are remembered, so that words
+    # that share substrings (like the words of a word list, or all words up to
+    # a given length) share the work.
+    def _derive(self, word):
+        derived = self.derived
+        if word in derived:
+            return derived[word]
+        n = len(word)
+        for length in range(1, n + 1):
+            for i in range(n - length + 1):
+                w = word[i:i + length]
+                if w in derived:
+                    continue
+                if length == 1:
+                    derived[w] = self.terminals.get(w, 0)
+                    continue
+                mask = 0
+                for k in range(1, length):
+                    left = derived[w[:k]]
+                    if left:
+                        right = derived[w[k:]]
+                        if right:
+                            mask |= self._combine(left, right)
+                derived[w] = mask
+        return derived[word]
+
+    def accepts(self, word):
+        if word == '':
+            return self.accepts_empty
+        return bool(self._derive(word) >> self.start & 1)
+
+    # Returns for each of the words whether the PDA accepts it.
+    def accepts_words(self, words):
+        return [self.accepts(word) for word in words]
+
+    # Returns the set of words of at most the given length that the PDA
+    # accepts, like gambatools' pda_words_up_to_n().
+    def words_up_to(self, length):
+        result = {''} if self.accepts_empty else set()
+        words = ['']
+        for n in range(length):
+            words = [word + a for word in words for a in self.symbols]
+            result.update(word for word in words if self.accepts(word))
+        return result
+
+
+# Returns the grammar of PDA P, which is stored with P so that it is shared
+# between all uses of P.
+def pda_grammar(P):
+    grammar = getattr(P, '_grammar', None)
+    if grammar is None:
+        grammar = P._grammar = CNFGrammar(P)
+    return grammar
@@ -1,10 +1,8 @@
 # Tests for PDAs.
 
-from gambatools.notebook import parse_pda
-
 def state_count(student_answer, max_states):
     try:
-        A = parse_pda(student_answer)
+        A = student_answer.pda()
     except RuntimeError as e:
         return {'correct': False,
                 'feedback': str(e)}
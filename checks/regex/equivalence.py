@@ -1,4 +1,5 @@
-from gambatools.notebook import parse_simple_regexp, generate_language, parse_word_list, compare_languages, regexp_accepts_word
+from gambatools.notebook import parse_simple_regexp, parse_word_list, compare_languages, regexp_accepts_word
+from checkrunner import generate_language
 
 def language_equivalence_words(student_answer, word_list, length):
     word_list = " ".join(word_list)
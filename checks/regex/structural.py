@@ -1,6 +1,4 @@
-# Tests for DFAs.
-
-from gambatools.notebook import parse_dfa, parse_nfa
+# Tests for regular expressions.
 
 def length(student_answer, max_length):
     l = len(student_answer)
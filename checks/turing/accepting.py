@@ -1,8 +1,10 @@
-from gambatools.notebook import parse_tm, tm_accepts_word, parse_word_list, generate_language, compare_languages
+from gambatools.notebook import parse_word_list
+from checkrunner import map_words
+from tm_engine import run_tm, ACCEPT, LOOP, OUT_OF_STEPS, MAX_STEPS
 
-def tm_accepts(student_answer, word_list):
+def tm_accepts(student_answer, word_list, max_steps=MAX_STEPS):
     try:
-        A = parse_tm(student_answer)
+        A = student_answer.tm()
     except RuntimeError as e:
         return {'correct': False,
                 'feedback': str(e)}
@@ -10,8 +12,18 @@ def tm_accepts(student_answer, word_list):
     word_list = " ".join(word_list)
     words = parse_word_list(word_list)
 
-    for word in words:
-        if not tm_accepts_word(A, word):
+    outcomes = map_words(run_tm, A, words, max_steps)
+    for word, outcome in zip(words, outcomes):
+        if outcome == LOOP:
+            return {'correct': False,
+                    'feedback': 'the machine loops on a word',
+                    'word': word}
+        elif outcome == OUT_OF_STEPS:
+            return {'correct': False,
+                    'feedback': 'the machine did not halt on a word',
+                    'word': word,
+                    'max_steps': max_steps}
+        elif outcome != ACCEPT:
             return {'correct': False,
                     'feedback': 'a word was rejected',
                     'word': word}
@@ -19,9 +31,11 @@ def tm_accepts(student_answer, word_list):
     return {'correct': True,
             'feedback': 'correct'}
 
-def tm_rejects(student_answer, word_list):
+# Words on which the machine does not halt are not accepted, so they count as
+# rejected.
+def tm_rejects(student_answer, word_list, max_steps=MAX_STEPS):
     try:
-        A = parse_tm(student_answer)
+        A = student_answer.tm()
     except RuntimeError as e:
         return {'correct': False,
                 'feedback': str(e)}
@@ -29,8 +43,9 @@ def tm_rejects(student_answer, word_list):
     word_list = " ".join(word_list)
     words = parse_word_list(word_list)
 
-    for word in words:
-        if tm_accepts_word(A, word):
+    outcomes = map_words(run_tm, A, words, max_steps)
+    for word, outcome in zip(words, outcomes):
+        if outcome == ACCEPT:
             return {'correct': False,
                     'feedback': 'a word was accepted',
                     'word': word}
@@ -1,14 +1,26 @@
-from gambatools.notebook import parse_tm, tm_accepts_word, parse_word_list, generate_language, compare_languages
+import itertools
+from gambatools.notebook import parse_word_list, compare_languages
+from checkrunner import generate_language, map_words
+from tm_engine import run_tm, ACCEPT
+
+# Returns the set of words of at most the given length that T accepts, like
+# gambatools' tm_words_up_to_n() (so with its step budget), simulating the
+# words with map_words().
+def _accepted_words(T, length):
+    symbols = sorted(T.Sigma)
+    words = [''.join(w) for n in range(length + 1) for w in itertools.product(symbols, repeat=n)]
+    outcomes = map_words(run_tm, T, words)
+    return {word for word, outcome in zip(words, outcomes) if outcome == ACCEPT}
 
 def language_equivalence_automaton(student_answer, other, length):
     try:
-        A = parse_tm(student_answer)
+        A = student_answer.tm()
     except RuntimeError as e:
         return {'correct': False,
                 'feedback': str(e)}
-    A_words = generate_language(A, length)
-    B = parse_tm(other)
-    B_words = generate_language(B, length)
+    A_words = generate_language(A, length, _accepted_words)
+    B = other.tm()
+    B_words = generate_language(B, length, _accepted_words)
     feedback = compare_languages(A_words, B_words)
     if len(feedback) == 0:
         return {'correct': True}
@@ -19,11 +31,11 @@ def language_equivalence_automaton(student_answer, other, length):
 def language_equivalence_words(student_answer, word_list, length):
     word_list = " ".join(word_list)
     try:
-        A = parse_tm(student_answer)
+        A = student_answer.tm()
     except RuntimeError as e:
         return {'correct': False,
                 'feedback': str(e)}
-    A_words = generate_language(A, length)
+    A_words = generate_language(A, length, _accepted_words)
     words = parse_word_list(word_list)
     feedback = compare_languages(A_words, words)
     if len(feedback) == 0:
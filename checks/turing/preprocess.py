@@ -1,10 +1,57 @@
 import json
+from gambatools.automaton import Automaton
+
+# The preprocessed answer. The gambatools TM object is built directly from the
+# states and transitions (without going through the text format) the first time
+# a check asks for it, and is then shared by all checks. Building fails with a
+# RuntimeError, like parse_tm() does.
+#
+# Furthermore, nondeterministic is the list of (p, a) for which there is more
+# than one transition from state p reading a from the tape, in the order in
+# which their second transition occurs.
+class TMAnswer:
+    def __init__(self, initial_state, accept_state, transitions):
+        self.initial_state = initial_state
+        self.accept_state = accept_state
+        self.transitions = transitions
+        self.nondeterministic = []
+        counts = {}
+        for (p, q, a) in transitions:
+            counts[p, a[0]] = counts.get((p, a[0]), 0) + 1
+            if counts[p, a[0]] == 2:
+                self.nondeterministic.append((p, a[0]))
+        items = {'blank': ['_']}
+        if accept_state is not None:
+            items['accept'] = [accept_state]
+        self.automaton = Automaton(set(), [(p, a, q) for (p, q, a) in transitions],
+                {initial_state}, set(), items)
+        self.built = None
+
+    def tm(self):
+        if self.built is None:
+            from gambatools.tm_algorithms import automaton_to_tm
+            try:
+                self.built = (automaton_to_tm(self.automaton), None)
+            except RuntimeError as e:
+                self.built = (None, e)
+        result, error = self.built
+        if error is not None:
+            raise error.with_traceback(None)
+        return result
+
+    # Returns the answer in the text format of gambatools.
+    def text(self):
+        lines = ["initial " + self.initial_state]
+        if self.accept_state is not None:
+            lines.append("accept " + self.accept_state)
+        lines.append("blank _")
+        for (p, q, a) in self.transitions:
+            lines.append(p + " " + q + " " + a)
+        return "".join(line + "\n" for line in lines)
 
 def preprocess(graph):
     graph = json.loads(graph)
 
-    text = ""
-
     initial_states = []
     final_states = []
     state_labels_seen = set()
@@ -21,28 +68,29 @@ def preprocess(graph):
             final_states.append(state['label'])
     if len(initial_states) != 1:
         raise Exception("Turing machine needs to have exactly one initial state. Your answer has " + str(len(initial_states)) + " initial states")
-    text += "initial " + initial_states[0] + "\n"
     if len(final_states) > 1:
         raise Exception("Turing machine needs to have at most one accepting state. Your answer has " + str(len(final_states)) + " accepting states")
-    if len(final_states) > 0:
-        text += "accept " + final_states[0] + "\n"
-
-    text += "blank _\n"
+    accept_state = final_states[0] if len(final_states) > 0 else None
 
+    transitions = []
     for transition in graph['edges']:
         if transition['from'] == -1:
             continue  # ignore the initial edge
-        
+
         if (not 'label' in transition) or (transition['label'] == ''):
             raise Exception("Turing machine contains a transition without a label")
-        
+
         p = graph['vertices'][transition['from']]['label']
         q = graph['vertices'][transition['to']]['label']
         a = transition['label']
 
         if len(a) != 4 or a[2] != ',' or a[3] not in ['L', 'R']:
             raise Exception('Invalid transition label "' + a + '" (correct syntax is "ab,L" or "ab,R" where "a" and "b" are the symbols read from and written to the tape, respectively)')
-        text += p + " " + q + " " + a + "\n"
+        transitions.append((p, q, a))
+
+    return TMAnswer(initial_states[0], accept_state, transitions)
 
-    #raise Exception(text)
-    return text
+# Custom checks get the answer in the text format of gambatools, so that they
+# can use parse_tm() on it.
+def custom_check_answer(answer):
+    return answer.text()
@@ -0,0 +1,99 @@
+# Fast simulation of Turing machines, working on the TM objects produced by
+# gambatools' parse_tm().
+#
+# A TM is first compiled into a CompiledTM, in which states and tape symbols are
+# numbered, so that the tape is a bytearray and the transition function is a
+# flat list indexed by state and symbol. The semantics are the same as those of
+# gambatools' tm_accepts_word(): the tape is bounded on the left (moving left
+# from the first cell stays there) and grows to the right as needed, and a
+# missing transition rejects the word.
+
+# the outcomes of running a TM on a word
+ACCEPT = 'accept'
+REJECT = 'reject'
+LOOP = 'loop'  # the TM returned to an earlier configuration, so it never halts
+OUT_OF_STEPS = 'out of steps'  # the TM did not halt within the step budget
+
+# the default step budget, which is the same as in gambatools
+MAX_STEPS = 1000
+
+
+class CompiledTM:
+    def __init__(self, T):
+        # the blank is symbol 0, and symbol 1 stands for all symbols of the
+        # input that the TM does not know (it has no transitions on them, so
+        # they are indistinguishable)
+        symbols = [T.blank, None] + sorted(T.Gamma - {T.blank})
+        if len(symbols) > 256:
+            raise RuntimeError('the Turing machine uses too many tape symbols')
+        self.codes = {a: i for i, a in enumerate(symbols) if a is not None}
+        states = [T.q0] + sorted(T.Q - {T.q0})
+        index = {q: i for i, q in enumerate(states)}
+        self.width = len(symbols)
+
+        # table[q * width + a] is (q1, b, left) for the transition from state
+        # q on symbol a to state q1, writing b and moving left if left is True,
+        # or None if there is no such transition
+        self.table = [None] * (len(states) * self.width)
+        for (p, a), (q, b, d) in T.delta.items():
+            self.table[index[p] * self.width + self.codes[a]] = (index[q], self.codes[b], d == 'L')
+        self.accept = index[T.q_accept]
+
+    # Runs the TM on word for at most max_steps steps, and returns ACCEPT,
+    # REJECT, LOOP or OUT_OF_STEPS. Loops are detected exactly (a configuration
+    # consists of the state, the head position and the tape without trailing
+    # blanks) using Brent's algorithm: the configuration is compared with a
+    # saved one, which is replaced after 1, 2, 4, 8, ... steps. This finds
+    # every loop within about twice the number of steps until its second
+    # iteration, and uses only the memory of one saved configuration.
+    def run(self, word, max_steps=MAX_STEPS):
+        codes = self.codes
+        tape = bytearray(codes.get(a, 1) for a in word) or bytearray(1)
+        table = self.table
+        width = self.width
+        accept = self.accept
+        q = 0
+        head = 0
+        if q == accept:
+            return ACCEPT
+
+        saved_q, saved_head, saved_tape = q, head, bytes(tape).rstrip(b'\0')
+        power = 1
+        age = 0
+        for _ in range(max_steps):
+            move = table[q * width + tape[head]]
+            if move is None:
+                return REJECT
+            q, tape[head], left = move
+            if left:
+                if head > 0:
+                    head -= 1
+            else:
+                head += 1
+                if head == len(tape):
+                    tape.append(0)
+            if q == accept:
+                return ACCEPT
+
+            if q == saved_q and head == saved_head and bytes(tape).rstrip(b'\0') == saved_tape:
+                return LOOP
+            age += 1
+            if age == power:
+                saved_q, saved_head, saved_tape = q, head, bytes(tape).rstrip(b'\0')
+                power *= 2
+                age = 0
+        return OUT_OF_STEPS
+
+
+# Returns the compiled version of TM T, which is stored with T so that it is
+# shared between all uses of T.
+def compile_tm(T):
+    compiled = getattr(T, '_compiled', None)
+    if compiled is None:
+        compiled = T._compiled = CompiledTM(T)
+    return compiled
+
+
+# Returns the outcome of running T on word (see CompiledTM.run()).
+def run_tm(T, word, max_steps=MAX_STEPS):
+    return compile_tm(T).run(word, max_steps)
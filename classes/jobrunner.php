@@ -81,6 +81,50 @@ class qtype_graphchecker_jobrunner {
     }
 
 
+    /**
+     * Checks that the code of the custom checks compiles, so that syntax
+     * errors can be reported when the question is saved rather than when a
+     * student answers it.
+     *
+     * @param $checks JSON string describing the checks.
+     * @return An array of error messages (empty if there are no errors, or if
+     * the sandbox could not be used to validate the checks).
+     */
+    public function validate_checks($checks) {
+        global $CFG;
+
+        $this->sandbox = new qtype_graphchecker_jobesandbox();
+
+        $code = "";
+        $code .= "import checkrunner\n";
+        $code .= "import json\n";
+        $code .= "checks = \"\"\"" . $this->py_escape($checks) . "\"\"\"\n";
+        $code .= "print(json.dumps(checkrunner.validate_checks(checks)))";
+
+        $full_name = $CFG->dirroot . '/question/type/graphchecker/checks/checkrunner.py';
+        $files = ['checkrunner.py' => file_get_contents($full_name)];
+
+        $run = $this->sandbox->execute($code,
+            "python3",  // language
+            null,  // stdin
+            $files,  // files
+            []);  // sandbox params
+
+        $this->sandbox->close();
+
+        if ($run->error !== qtype_graphchecker_sandbox::OK ||
+                $run->result !== qtype_graphchecker_sandbox::RESULT_SUCCESS) {
+            return [];
+        }
+
+        $errors = json_decode($run->output, true);
+        if (json_last_error() !== JSON_ERROR_NONE) {
+            return [];
+        }
+        return $errors;
+    }
+
+
     private function get_code($question, $answer, $checks) {
         $code = "";
 
@@ -330,6 +330,16 @@ class qtype_graphchecker_edit_form extends question_edit_form {
             }
         }
 
+        // check the code of custom checks for syntax errors (this needs the
+        // sandbox, so only do it if there are any custom checks)
+        if (count($errors) === 0 && $this->has_custom_checks($checks)) {
+            $runner = new qtype_graphchecker_jobrunner();
+            $checkerrors = $runner->validate_checks($data['checks']);
+            if (count($checkerrors) > 0) {
+                $errors['checks'] = implode('<br>', array_map('s', $checkerrors));
+            }
+        }
+
         // next, if validateonsave was set, run the checks and see if they
         // pass (but don't even try to do that if we already had errors up
         // until this point)
@@ -372,6 +382,19 @@ class qtype_graphchecker_edit_form extends question_edit_form {
         return $result;
     }
 
+    /**
+     * Returns whether the given (decoded) checks contain a custom check.
+     */
+    private function has_custom_checks($checks) {
+        foreach ($checks as $check) {
+            if ((!array_key_exists("type", $check) || $check["type"] === "check") &&
+                    $check['module'] === 'custom') {
+                return true;
+            }
+        }
+        return false;
+    }
+
     /**
      * Construct a question object containing all the fields from $data.
      * Used when validating the feedback answer.
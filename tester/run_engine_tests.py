@@ -0,0 +1,165 @@
+#!/usr/bin/python3
+
+# Script to compare the fast automaton algorithms used by the checks (such as
+# checks/fsm/fsm_engine.py) with the gambatools functions they replace, on
+# randomly generated automata. The random generator is seeded, so a failure can
+# be reproduced by running the same test again.
+
+import itertools
+import os
+import random
+import sys
+import traceback
+
+checks_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'checks')
+
+# Returns a random automaton in the text format of gambatools, with states q0,
+# ..., q<n - 1> and transitions labeled by random choices from labels.
+def random_automaton(rng, max_states, labels):
+	n = rng.randint(1, max_states)
+	states = ['q' + str(i) for i in range(n)]
+	lines = ['initial q0']
+	final = [q for q in states if rng.random() < 0.4]
+	if final:
+		lines.append('final ' + ' '.join(final))
+	for i in range(rng.randint(0, 3 * n)):
+		lines.append(rng.choice(states) + ' ' + rng.choice(states) + ' ' + labels(rng))
+	return '\n'.join(lines) + '\n'
+
+# Returns a random total DFA over {a, b} in the text format of gambatools.
+def random_dfa(rng, max_states):
+	n = rng.randint(1, max_states)
+	states = ['q' + str(i) for i in range(n)]
+	lines = ['initial q0']
+	final = [q for q in states if rng.random() < 0.4]
+	if final:
+		lines.append('final ' + ' '.join(final))
+	for q in states:
+		for a in 'ab':
+			lines.append(q + ' ' + rng.choice(states) + ' ' + a)
+	return '\n'.join(lines) + '\n'
+
+def words_up_to(symbols, length):
+	return [''.join(w) for n in range(length + 1) for w in itertools.product(symbols, repeat=n)]
+
+def test_fsm(rng):
+	from gambatools.notebook import parse_nfa, parse_dfa, nfa_accepts_word, generate_language, compare_languages
+	from gambatools.dfa_algorithms import dfa_remove_unreachable_states
+	from fsm_engine import accepts_words, accepts_words_batch, count_words, compare_automata, compare_with_words, minimize
+
+	words = words_up_to('ab', 5)
+	for i in range(200):
+		text = random_automaton(rng, 5, lambda rng: rng.choice('abε'))
+		A = parse_nfa(text)
+		assert accepts_words(A, words) == {w: nfa_accepts_word(A, w) for w in words}, text
+		language = generate_language(A, 5)
+		assert count_words(A, 5) == [sum(1 for w in language if len(w) == n) for n in range(6)], text
+
+		B = parse_nfa(random_automaton(rng, 3, lambda rng: rng.choice('abε')))
+		expected = compare_languages(language, generate_language(B, 5)) == []
+		assert (compare_automata(A, B, 5) == []) == expected, text
+		assert (compare_with_words(A, generate_language(B, 5), 5) == []) == expected, text
+
+	# with max_states 3, some of the automata are too large for the NumPy table
+	# and are simulated one by one instead
+	for max_states in [3, 256]:
+		for i in range(20):
+			automata = [parse_nfa(random_automaton(rng, 5, lambda rng: rng.choice('abε'))) for j in range(10)]
+			batch_words = rng.sample(words, 20) + ['c', 'abc']
+			expected = []
+			for A in automata:
+				accepted = accepts_words(A, batch_words)
+				expected.append([accepted[w] for w in batch_words])
+			assert accepts_words_batch(automata, batch_words, max_states) == expected, max_states
+
+	for i in range(200):
+		text = random_dfa(rng, 6)
+		D = parse_dfa(text)
+		# two reachable states are equivalent if they accept the same words of
+		# length less than the number of states
+		D = dfa_remove_unreachable_states(D)
+		short_words = words_up_to('ab', len(D.Q) - 1)
+		def residual(q):
+			accepted = []
+			for word in short_words:
+				q1 = q
+				for a in word:
+					q1 = D.delta[q1, a]
+				accepted.append(q1 in D.F)
+			return tuple(accepted)
+		assert minimize(D).size == len({residual(q) for q in D.Q}), text
+
+# Returns a random deterministic TM over {a, b} in the text format of
+# gambatools, with states q0, ..., q<n - 1> and the accepting state q<n>.
+def random_tm(rng, max_states):
+	n = rng.randint(1, max_states)
+	states = ['q' + str(i) for i in range(n + 1)]
+	lines = ['initial q0', 'accept q' + str(n), 'blank _']
+	for q in states[:-1]:
+		for a in 'ab_x':
+			if rng.random() < 0.7:
+				lines.append(q + ' ' + rng.choice(states) + ' ' + a + rng.choice('ab_x') + ',' + rng.choice('LR'))
+	return '\n'.join(lines) + '\n'
+
+def test_turing(rng):
+	from gambatools.notebook import parse_tm, tm_accepts_word
+	from tm_engine import run_tm, ACCEPT, REJECT, LOOP, OUT_OF_STEPS
+
+	# c is not a tape symbol of any of the machines
+	words = words_up_to('ab', 4) + ['c', 'ac']
+	for i in range(300):
+		text = random_tm(rng, 4)
+		T = parse_tm(text)
+		max_steps = rng.choice([10, 100, 1000])
+		for word in words:
+			expected = tm_accepts_word(T, word, max_steps)
+			outcome = run_tm(T, word, max_steps)
+			if expected is None:
+				assert outcome in (LOOP, OUT_OF_STEPS), (text, word)
+			else:
+				assert outcome == (ACCEPT if expected else REJECT), (text, word)
+
+# Returns a random PDA label over {a, b} with stack symbols x and y. The ε
+# transitions never push, since gambatools gives up on the ε closure of a PDA
+# that can push forever without reading (which the grammar handles exactly).
+def random_pda_label(rng):
+	a = rng.choice('ab_')
+	return a + ',' + rng.choice('xy_') + (rng.choice('xy_') if a != '_' else '_')
+
+def test_pda(rng):
+	from gambatools.notebook import parse_pda, pda_accepts_word, pda_words_up_to_n
+	from pda_grammar import CNFGrammar
+
+	words = words_up_to('ab', 5)
+	for i in range(300):
+		text = random_automaton(rng, 5, random_pda_label)
+		P = parse_pda(text)
+		G = CNFGrammar(P)
+		assert G.accepts_words(words) == [pda_accepts_word(P, w) for w in words], text
+		assert G.words_up_to(4) == pda_words_up_to_n(P, 4), text
+
+tests = {
+	'fsm': test_fsm,
+	'turing': test_turing,
+	'pda': test_pda
+}
+
+def run_test(graph_type):
+	sys.path.insert(0, os.path.join(checks_dir, graph_type))
+	try:
+		tests[graph_type](random.Random(graph_type))
+	except:
+		print('\033[1m\033[91mfail ' + graph_type + '\033[0m')
+		print('    ' + traceback.format_exc().replace('\n', '\n    '))
+		return
+	finally:
+		sys.path.pop(0)
+	print('\033[1m\033[92mpass\033[0m ' + graph_type + '\033[0m')
+
+if len(sys.argv) < 2 or any(graph_type not in tests for graph_type in sys.argv[1:]):
+	print('Usage: python3 run_engine_tests.py <graph_type>+')
+	print('    where <graph_type> is one of: ' + ', '.join(tests))
+	sys.exit(1)
+
+for graph_type in sys.argv[1:]:
+	run_test(graph_type)